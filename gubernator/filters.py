@@ -230,10 +230,6 @@ def do_ltrim(s, needle):
     return s
 
 
-def do_select(seq, pred):
-    return filter(pred, seq)
-
-
 def do_tg_url(testgrid_query, test_name=''):
     if test_name:
         regex = '^Overall$|' + re.escape(test_name)
@@ -14,6 +14,7 @@
 
 import json
 import logging
+import time
 import urlparse
 import zlib
 
@@ -25,6 +26,24 @@ GCS_API_URL = 'https://storage.googleapis.com'
 STORAGE_API_URL = 'https://www.googleapis.com/storage/v1/b'
 MAX_SIZE = 30 * 1024 ** 2  # 30MiB
 
+# (token, expiration time) of the last access token vended for GCS.
+_auth_token = [None, 0]
+
+
+def get_auth_token():
+    """Return an access token for GCS, reusing it until shortly before it expires.
+
+    app_identity.get_access_token blocks on an API call, so calling it for
+    every fetch would serialize the start of each fan-out of reads.
+    """
+    token, expires = _auth_token
+    if not token or expires - 60 < time.time():
+        token, expires = app_identity.get_access_token(
+            'https://www.googleapis.com/auth/cloud-platform')
+        _auth_token[:] = [token, expires]
+    return token
+
+
 @ndb.tasklet
 def get(url):
     context = ndb.get_context()
@@ -36,8 +55,7 @@ def get(url):
 
     url_result = urlparse.urlparse(url)
     if url_result.netloc.endswith('.googleapis.com'):
-        auth_token, _ = app_identity.get_access_token(
-            'https://www.googleapis.com/auth/cloud-platform')
+        auth_token = get_auth_token()
         if auth_token:
             headers['Authorization'] = 'OAuth %s' % auth_token
 
@@ -13,9 +13,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import re
-import json
-
 import jinja2
 
 import regex
@@ -61,9 +58,16 @@ def make_dict(data, pod_re, objref_dict):
 
     This dictionary is lifted from the line with the ObjectReference
     """
+    return make_dict_lines(unicode(jinja2.escape(data)).split('\n'),
+                           pod_re, objref_dict)
+
+
+def make_dict_lines(lines, pod_re, objref_dict):
+    """
+    Like make_dict, but takes the already escaped lines of the log file.
+    """
     pod_in_file = False
 
-    lines = unicode(jinja2.escape(data)).split('\n')
     for line in lines:
         if pod_re.search(line):
             pod_in_file = True
@@ -72,10 +76,7 @@ def make_dict(data, pod_re, objref_dict):
             if containerID and not objref_dict.get("ContainerID"):
                 objref_dict["ContainerID"] = containerID.group(1)
             if objref:
-                objref_dict_re = objref.group(1)
-                objref_dict_re = re.sub(r'(\w+):', r'"\1": ', objref_dict_re)
-                objref_dict_re = objref_dict_re.replace('&#34;', '"')
-                objref_dict_re = json.loads(objref_dict_re)
+                objref_dict_re = dict(regex.objref_field_re.findall(objref.group(1)))
                 objref_dict_re.update(objref_dict)
                 return objref_dict_re, pod_in_file
 
@@ -62,6 +62,17 @@ class KubeletParserTest(unittest.TestCase):
         objref_dict = kubelet_parser.make_dict(lines, regex.wordRE("abc"), {})
         self.assertEqual(objref_dict, ({"UID":"uid", "Namespace":"podName", "Name":"abc"}, True))
 
+    def test_make_dict_colon_values(self):
+        """Test values containing "key:" survive extraction"""
+        line = ('Event(api.ObjectReference{Kind:"Pod", Namespace:"ns", Name:"abc", '
+                'UID:"uid", FieldPath:"spec.containers{c: image:tag}"})')
+        objref_dict, pod_in_file = kubelet_parser.make_dict(
+            line, regex.wordRE("abc"), {"ContainerID": "cid"})
+        self.assertTrue(pod_in_file)
+        self.assertEqual(objref_dict, {
+            "Kind": "Pod", "Namespace": "ns", "Name": "abc", "UID": "uid",
+            "FieldPath": "spec.containers{c: image:tag}", "ContainerID": "cid"})
+
     def test_make_dict_fail(self):
         """Test when objref line not in file"""
         objref_dict = kubelet_parser.make_dict(["pod failed"], regex.wordRE("abc"), {})
@@ -24,9 +24,7 @@ CONTEXT_DEFAULT = 6
 MAX_BUFFER = 5000000  # GAE has RAM limits.
 
 
-def highlight(line, highlight_words):
-    # Join all the words that need to be bolded into one regex
-    words_re = regex.combine_wordsRE(highlight_words)
+def highlight(line, words_re):
     line = words_re.sub(r'<span class="keyword">\1</span>', line)
     return '<span class="highlight">%s</span>' % line
 
@@ -44,9 +42,15 @@ def log_html(lines, matched_lines, highlight_words, skip_fmt):
         tag, with "interesting" errors highlighted
     """
     output = []
+    # Bound methods are looked up once; this loop can run for every log line.
+    out_append = output.append
+    out_extend = output.extend
 
     matched_lines.append(len(lines))  # sentinel value
 
+    # Join all the words that need to be bolded into one regex
+    words_re = regex.combine_wordsRE(highlight_words)
+
     # Escape hatch: if we're going to generate a LOT of output, try to trim it down.
     context_lines = CONTEXT_DEFAULT
     if len(matched_lines) > 2000:
@@ -56,26 +60,51 @@ def log_html(lines, matched_lines, highlight_words, skip_fmt):
     for match in matched_lines:
         if last_match is not None:
             previous_end = min(match, last_match + context_lines + 1)
-            output.extend(lines[last_match + 1: previous_end])
+            out_extend(lines[last_match + 1: previous_end])
         else:
             previous_end = 0
         if match == len(lines):
             context_lines = 0
         skip_amount = match - previous_end - context_lines
         if skip_amount > 1:
-            output.append('<span class="skip" data-range="%d-%d">%s</span>' %
-                          (previous_end, match - context_lines, skip_fmt(skip_amount)))
+            out_append('<span class="skip" data-range="%d-%d">%s</span>' %
+                       (previous_end, match - context_lines, skip_fmt(skip_amount)))
         elif skip_amount == 1:  # pointless say we skipped 1 line
-            output.append(lines[previous_end])
+            out_append(lines[previous_end])
         if match == len(lines):
             break
-        output.extend(lines[max(previous_end, match - context_lines): match])
-        output.append(highlight(lines[match], highlight_words))
+        out_extend(lines[max(previous_end, match - context_lines): match])
+        out_append(highlight(lines[match], words_re))
         last_match = match
 
     return output
 
 
+def matching_lines(lines, error_re):
+    """
+    Returns the indices of lines that error_re matches, in order.
+
+    The regex is run over the joined log rather than line by line, resuming at
+    the start of the next line after each match.
+    """
+    text = '\n'.join(lines)
+    search = error_re.search
+    matched_lines = []
+    line_no = 0
+    pos = 0
+    while True:
+        match = search(text, pos)
+        if not match:
+            break
+        line_no += text.count('\n', pos, match.start())
+        matched_lines.append(line_no)
+        pos = text.find('\n', match.start()) + 1
+        if not pos:
+            break
+        line_no += 1
+    return matched_lines
+
+
 def truncate(data, limit=MAX_BUFFER):
     if len(data) <= limit:
         return data
@@ -91,6 +120,10 @@ def truncate(data, limit=MAX_BUFFER):
 
     return ''.join([data[:half], '\n' * cut_newlines, data[-half:]])
 
+def escape_lines(data):
+    """Returns the HTML-escaped lines of data, shareable between parsers."""
+    return unicode(jinja2.escape(data)).split('\n')
+
 def digest(data, objref_dict=None, filters=None, error_re=regex.error_re,
     skip_fmt=lambda l: '... skipping %d lines ...' % l):
     # pylint: disable=too-many-arguments
@@ -102,8 +135,15 @@ def digest(data, objref_dict=None, filters=None, error_re=regex.error_re,
     """
     if isinstance(data, str):  # the test mocks return str instead of unicode
         data = data.decode('utf8', 'replace')
-    lines = unicode(jinja2.escape(truncate(data))).split('\n')
+    return digest_lines(escape_lines(truncate(data)), objref_dict, filters,
+                        error_re, skip_fmt)
 
+def digest_lines(lines, objref_dict=None, filters=None, error_re=regex.error_re,
+    skip_fmt=lambda l: '... skipping %d lines ...' % l):
+    # pylint: disable=too-many-arguments
+    """
+    Like digest, but takes the already escaped and truncated lines of the log.
+    """
     if filters is None:
         filters = {'Namespace': '', 'UID': '', 'pod': '', 'ContainerID':''}
 
@@ -113,11 +153,13 @@ def digest(data, objref_dict=None, filters=None, error_re=regex.error_re,
         highlight_words = [filters["pod"]]
 
     if not (filters["UID"] or filters["Namespace"] or filters["ContainerID"]):
-        matched_lines = [n for n, line in enumerate(lines) if error_re.search(line)]
+        matched_lines = matching_lines(lines, error_re)
     else:
         matched_lines, highlight_words = kubelet_parser.parse(lines,
             highlight_words, filters, objref_dict)
 
+    # output mostly holds references to strings in lines, so one join that
+    # sizes the result up front is cheaper than writing to a StringIO.
     output = log_html(lines, matched_lines, highlight_words, skip_fmt)
     output.append('')
 
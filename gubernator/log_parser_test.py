@@ -87,6 +87,13 @@ class LogParserTest(unittest.TestCase):
             filters={"pod": "pod", "UID": "", "Namespace": "", "ContainerID":""}),
             's2 2 3 4 5 pod 6 7 8 9 10')
 
+    def test_matching_lines(self):
+        lines = ['error error', 'ok', 'fail', '', 'm', 'failed: error']
+        self.assertEqual(log_parser.matching_lines(lines, regex.error_re),
+                         [n for n, line in enumerate(lines)
+                          if regex.error_re.search(line)])
+        self.assertEqual(log_parser.matching_lines([], regex.error_re), [])
+
     def test_truncate(self):
         limit = 32
         data = '\n'.join(str(x) for x in range(100))
@@ -41,7 +41,7 @@ def builds_to_table(jobs):
 
     versions = {}       # {version: {job: build_count}}
     version_start = {}  # {version: first_build_start_time}
-    for job, builds in jobs.iteritems():
+    for job, builds in jobs.items():
         for build, started, finished in builds:
             if not started:
                 continue
@@ -53,8 +53,8 @@ def builds_to_table(jobs):
             begin = int(started['timestamp'])
             version_start[version] = min(begin, version_start.get(version, begin))
 
-    version_widths = {version: max(jobs.values()) for version, jobs in versions.iteritems()}
-    versions_ordered = sorted(versions, key=lambda v: version_start[v], reverse=True)
+    version_widths = {version: max(jobs.values()) for version, jobs in versions.items()}
+    versions_ordered = sorted(versions, key=version_start.get, reverse=True)
     version_colstart = {}
     cur = 0
     for version in versions_ordered:
@@ -66,7 +66,7 @@ def builds_to_table(jobs):
                 for version in versions_ordered]
 
     rows = []
-    for job, builds in sorted(jobs.iteritems()):
+    for job, builds in sorted(jobs.items()):
         row = []
         n = 0
         for build, started, finished in builds:
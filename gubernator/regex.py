@@ -42,9 +42,23 @@ error_re = re.compile(
 def objref(line):
     return re.search(r'api\.ObjectReference(\{.*?&#34;\})', line)
 
+# Match the (escaped) key:"value" pairs inside an ObjectReference dictionary
+objref_field_re = re.compile(r'(\w+):&#34;(.*?)&#34;')
+
 # Combine a list of words into one regex that match any of them
+# Memoized, since a filtered digest combines the same words more than once.
+_combined_words = {}
+_COMBINED_WORDS_MAX = 128
+
 def combine_wordsRE(words_list):
-    return re.compile(r'\b(%s)\b' % '|'.join(words_list), re.IGNORECASE)
+    key = tuple(words_list)
+    words_re = _combined_words.get(key)
+    if words_re is None:
+        if len(_combined_words) >= _COMBINED_WORDS_MAX:
+            _combined_words.clear()
+        words_re = _combined_words[key] = re.compile(
+            r'\b(%s)\b' % '|'.join(words_list), re.IGNORECASE)
+    return words_re
 
 # Match the file name of a log given a filepath to the log
 log_re = re.compile(r'[^/]+\.log$')
@@ -61,6 +61,17 @@ class RegexTest(unittest.TestCase):
                 'objref(%r) should be %r' % (text, matches))
 
 
+    def test_objref_field_re(self):
+        for text, fields in [
+            ('{Kind:&#34;Pod&#34;}', [('Kind', 'Pod')]),
+            ('{Namespace:&#34;ns&#34;, Name:&#34;abc&#34;, UID:&#34;u-1&#34;}',
+             [('Namespace', 'ns'), ('Name', 'abc'), ('UID', 'u-1')]),
+            ('{Name:&#34;&#34;, Pod:abc}', [('Name', '')]),
+        ]:
+            self.assertEqual(regex.objref_field_re.findall(text), fields,
+                'objref_field_re.findall(%r) should be %r' % (text, fields))
+
+
     def test_combine_wordsRE(self):
         for text, matches in [
             ('pod123 failed', True),
@@ -70,6 +81,9 @@ class RegexTest(unittest.TestCase):
             self.assertEqual(bool(regex.combine_wordsRE(["pod123", "volume", "a123"])), matches,
                 'combine_words(%r) should be %r' % (text, matches))
 
+        self.assertIs(regex.combine_wordsRE(["pod123", "volume"]),
+                      regex.combine_wordsRE(("pod123", "volume")))
+
 
     def test_log_re(self):
         for text, matches in [
@@ -20,6 +20,15 @@ import argparse
 import os
 import yaml
 
+# libyaml's loader is much faster across the many job configs, when it's available.
+SAFE_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def load_yaml(path):
+    with open(path) as fp:
+        return yaml.load(fp, Loader=SAFE_LOADER)
+
+
 def main(prow_config, prow_job_config, gubernator_config):
     configs = [prow_config]
     for root, _, files in os.walk(prow_job_config):
@@ -32,7 +41,7 @@ def main(prow_config, prow_job_config, gubernator_config):
     default_presubmits = set()
     periodic_names = set()
     for config in configs:
-        prow_data = yaml.safe_load(open(config))
+        prow_data = load_yaml(config)
 
         if not prow_data:
             continue
@@ -45,7 +54,7 @@ def main(prow_config, prow_job_config, gubernator_config):
             for job in prow_data['periodics']:
                 periodic_names.add(job['name'])
 
-    gubernator_data = yaml.safe_load(open(gubernator_config))
+    gubernator_data = load_yaml(gubernator_config)
 
     gubernator_data['jobs']['kubernetes-jenkins/pr-logs/directory/'] = sorted(
         default_presubmits)
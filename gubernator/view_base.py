@@ -104,11 +104,41 @@ class IndexHandler(BaseHandler):
         self.render("index.html", {'jobs': self.app.config['jobs']})
 
 
+def memcache_get(prefix, args):
+    """Returns the value memcache_memoize(prefix) stored for args, or None."""
+    return memcache.get('%s%s' % (prefix, args),
+                        namespace=os.environ['CURRENT_VERSION_ID'])
+
+
+def memcache_add(prefix, args, data, expires=60 * 60, neg_expires=60):
+    """Stores data as the value memcache_memoize(prefix) would for args.
+
+    This lets a caller that computes a memoized value itself, for example
+    from reads it already started, share the decorated function's cache.
+    """
+    serialized_length = len(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+    if serialized_length > 1000000:
+        logging.warning('data too large to fit in memcache: %s > 1MB',
+                        serialized_length)
+        return
+    # setting the namespace based on the current version prevents different
+    # versions from sharing cache values -- meaning there's no need to worry
+    # about incompatible old key/value pairs
+    try:
+        memcache.add('%s%s' % (prefix, args), data,
+                     expires if data else neg_expires,
+                     namespace=os.environ['CURRENT_VERSION_ID'])
+    except ValueError:
+        logging.exception('unable to write to memcache')
+
+
 def memcache_memoize(prefix, expires=60 * 60, neg_expires=60):
     """Decorate a function to memoize its results using memcache.
 
-    The function must take a single string as input, and return a pickleable
-    type.
+    The function must take positional arguments with stable reprs, such as
+    strings and bools, and return a pickleable type. The key is the prefix
+    followed by the repr of the argument tuple, so memcache_get and
+    memcache_add with the same prefix and arguments use the same entry.
 
     Args:
         prefix: A prefix for memcache keys to use for memoization.
@@ -117,51 +147,46 @@ def memcache_memoize(prefix, expires=60 * 60, neg_expires=60):
     Returns:
         A decorator closure to wrap the function.
     """
-    # setting the namespace based on the current version prevents different
-    # versions from sharing cache values -- meaning there's no need to worry
-    # about incompatible old key/value pairs
-    namespace = os.environ['CURRENT_VERSION_ID']
     def wrapper(func):
         @functools.wraps(func)
         def wrapped(*args):
-            key = '%s%s' % (prefix, args)
-            data = memcache.get(key, namespace=namespace)
+            data = memcache_get(prefix, args)
             if data is not None:
                 return data
-            else:
-                data = func(*args)
-                serialized_length = len(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
-                if serialized_length > 1000000:
-                    logging.warning('data too large to fit in memcache: %s > 1MB',
-                                    serialized_length)
-                    return data
-                try:
-                    if data:
-                        memcache.add(key, data, expires, namespace=namespace)
-                    else:
-                        memcache.add(key, data, neg_expires, namespace=namespace)
-                except ValueError:
-                    logging.exception('unable to write to memcache')
-                return data
+            data = func(*args)
+            memcache_add(prefix, args, data, expires, neg_expires)
+            return data
         return wrapped
     return wrapper
 
 
-@memcache_memoize('gs-ls://', expires=60)
-def gcs_ls(path):
-    """Enumerate files in a GCS directory. Returns a list of FileStats."""
+def list_gcs(path, recursive=False):
+    """Enumerate files in a GCS directory, without caching."""
     if path[-1] != '/':
         path += '/'
+    if recursive:
+        return list(gcs.listbucket(path))
     return list(gcs.listbucket(path, delimiter='/'))
 
+
+@memcache_memoize('gs-ls://', expires=60)
+def gcs_ls(path):
+    """Enumerate files in a GCS directory. Returns a list of FileStats."""
+    return list_gcs(path)
+
 @memcache_memoize('gs-ls-recursive://', expires=60)
 def gcs_ls_recursive(path):
     """Enumerate files in a GCS directory recursively. Returns a list of FileStats."""
-    if path[-1] != '/':
-        path += '/'
+    return list_gcs(path, recursive=True)
+
+
+NUMBER_RE = re.compile(r'\d+')
+
+
+def _pad_number(match):
+    return match.group(0).rjust(16, '0')
 
-    return list(gcs.listbucket(path))
 
 def pad_numbers(s):
     """Modify a string to make its numbers suitable for natural sorting."""
-    return re.sub(r'\d+', lambda m: m.group(0).rjust(16, '0'), s)
+    return NUMBER_RE.sub(_pad_number, s)
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
 import logging
 import json
 import os
@@ -20,6 +21,7 @@ import re
 import defusedxml.ElementTree as ET
 
 from google.appengine.api import urlfetch
+import google.appengine.ext.ndb as ndb
 
 import gcs_async
 from github import models
@@ -27,6 +29,16 @@ import log_parser
 import testgrid
 import view_base
 
+JUNIT_RE = re.compile(r'junit.*\.xml')
+BUILD_NUMBER_TXT_RE = re.compile(r'/(\d*)\.txt$')
+# Bytes that commonly make otherwise reasonable junit files unparseable.
+BAD_XML_BYTES_RE = re.compile(r'[\x00\x80-\xFF]+')
+
+BUILD_LOG_PREFIX = 'build-log-parsed://'
+BUILD_LOG_EXPIRES = 60*60*4
+FINISHED_DETAILS_PREFIX = 'build-details-finished://'
+FINISHED_DETAILS_EXPIRES = 60*60*24
+
 
 class JUnitParser(object):
     def __init__(self):
@@ -70,9 +82,9 @@ class JUnitParser(object):
         except ET.ParseError, e:
             logging.exception('parse_junit failed for %s', filename)
             try:
-                tree = ET.fromstring(re.sub(r'[\x00\x80-\xFF]+', '?', xml))
+                tree = ET.fromstring(BAD_XML_BYTES_RE.sub('?', xml))
             except ET.ParseError, e:
-                if re.match(r'junit.*\.xml', os.path.basename(filename)):
+                if JUNIT_RE.match(os.path.basename(filename)):
                     self.failed.append(
                         ('Gubernator Internal Fatal XML Parse Error', 0.0, str(e), filename, ''))
                 return
@@ -95,9 +107,13 @@ class JUnitParser(object):
         }
 
 
-@view_base.memcache_memoize('build-log-parsed://', expires=60*60*4)
+@view_base.memcache_memoize(BUILD_LOG_PREFIX, expires=BUILD_LOG_EXPIRES)
 def get_build_log(build_dir):
-    build_log = gcs_async.read(build_dir + '/build-log.txt').get_result()
+    return digest_build_log(gcs_async.read(build_dir + '/build-log.txt'))
+
+
+def digest_build_log(build_log_future):
+    build_log = build_log_future.get_result()
     if build_log:
         return log_parser.digest(build_log)
 
@@ -124,14 +140,11 @@ def normalize_metadata(started_future, finished_future):
     """
     started = started_future.get_result()
     finished = finished_future.get_result()
-    if finished and not started:
-        started = 'null'
-    elif started and not finished:
-        finished = 'null'
-    elif not (started and finished):
+    if not (started or finished):
         return None, None
-    started = json.loads(started)
-    finished = json.loads(finished)
+    # Only decode the files that exist; a missing one is None.
+    started = json.loads(started) if started else None
+    finished = json.loads(finished) if finished else None
 
     if finished is not None:
         # we want to allow users pushing to GCS to
@@ -151,6 +164,8 @@ def build_details(build_dir, recursive=False):
     """
     Collect information from a build directory.
 
+    Completed builds are cached for a day, keyed on their finished.json.
+
     Args:
         build_dir: GCS path containing a build's results.
         recursive: Whether to scan artifacts recursively for XML files.
@@ -162,26 +177,59 @@ def build_details(build_dir, recursive=False):
                   skipped: [name...],
                   passed: [name...]}
     """
-    started, finished = normalize_metadata(
-        gcs_async.read(build_dir + '/started.json'),
-        gcs_async.read(build_dir + '/finished.json')
-    )
+    started_fut = gcs_async.read(build_dir + '/started.json')
+    finished_fut = gcs_async.read(build_dir + '/finished.json')
+    finished = finished_fut.get_result()
+    if not finished:
+        return read_build_details(build_dir, recursive, started_fut, finished_fut)
+    # A build's results don't change once finished.json is written, so
+    # they can outlive the short cache above. Hashing the content keeps
+    # a rewritten finished.json from serving stale results.
+    key_args = (build_dir, recursive, hashlib.sha1(finished).hexdigest())
+    details = view_base.memcache_get(FINISHED_DETAILS_PREFIX, key_args)
+    if details is None:
+        details = read_build_details(build_dir, recursive, started_fut, finished_fut,
+                                     cached_ls=False)
+        view_base.memcache_add(FINISHED_DETAILS_PREFIX, key_args, details,
+                               FINISHED_DETAILS_EXPIRES)
+    return details
+
+
+def read_build_details(build_dir, recursive, started_fut, finished_fut, cached_ls=True):
+    """Uncached build_details, given futures for started and finished.json.
+
+    cached_ls=False lists artifacts fresh, so that results meant to be kept
+    for a long time don't come from a listing made while uploads were running.
+    """
+    started, finished = normalize_metadata(started_fut, finished_fut)
 
     if started is None and finished is None:
         return started, finished, None
 
-    if recursive:
-        artifact_paths = view_base.gcs_ls_recursive('%s/artifacts' % build_dir)
+    artifacts_dir = '%s/artifacts' % build_dir
+    if not cached_ls:
+        artifact_paths = view_base.list_gcs(artifacts_dir, recursive)
+    elif recursive:
+        artifact_paths = view_base.gcs_ls_recursive(artifacts_dir)
     else:
-        artifact_paths = view_base.gcs_ls('%s/artifacts' % build_dir)
+        artifact_paths = view_base.gcs_ls(artifacts_dir)
 
     junit_paths = [f.filename for f in artifact_paths if f.filename.endswith('.xml')]
 
-    junit_futures = {f: gcs_async.read(f) for f in junit_paths}
+    pending = [(gcs_async.read(f), f) for f in junit_paths]
 
+    # Parse files as soon as they arrive, so parsing overlaps the reads
+    # that are still in flight. Results are sorted, so order doesn't matter.
     parser = JUnitParser()
-    for path, future in junit_futures.iteritems():
-        parser.parse_xml(future.get_result(), path)
+    while pending:
+        ndb.Future.wait_any([future for future, _ in pending])
+        waiting = []
+        for future, path in pending:
+            if future.done():
+                parser.parse_xml(future.get_result(), path)
+            else:
+                waiting.append((future, path))
+        pending = waiting
     return started, finished, parser.get_results()
 
 
@@ -233,6 +281,14 @@ class BuildHandler(view_base.BaseHandler):
         testgrid_query = testgrid.path_to_query(job_dir)
         build_dir = job_dir + build
         issues_fut = models.GHIssueDigest.find_xrefs_async(build_dir)
+        build_log = None
+        build_log_fut = None
+        if 'log' in self.request.params:
+            # The log is always shown when asked for, so on a cache miss
+            # read it while build_details does its own reads.
+            build_log = view_base.memcache_get(BUILD_LOG_PREFIX, (build_dir,))
+            if build_log is None:
+                build_log_fut = gcs_async.read(build_dir + '/build-log.txt')
         started, finished, results = build_details(
             build_dir, self.app.config.get('recursive_artifacts', True))
         if started is None and finished is None:
@@ -244,12 +300,18 @@ class BuildHandler(view_base.BaseHandler):
             return
 
         want_build_log = False
-        build_log = ''
         build_log_src = None
         if 'log' in self.request.params or (not finished) or \
             (finished and finished.get('result') != 'SUCCESS' and len(results['failed']) <= 1):
             want_build_log = True
-            build_log = get_build_log(build_dir)
+            if build_log_fut:
+                build_log = digest_build_log(build_log_fut)
+                view_base.memcache_add(BUILD_LOG_PREFIX, (build_dir,), build_log,
+                                       BUILD_LOG_EXPIRES)
+            elif build_log is None:
+                build_log = get_build_log(build_dir)
+        else:
+            build_log = ''
 
         pr, pr_path, pr_digest = None, None, None
         repo = '%s/%s' % (self.app.config['default_org'],
@@ -316,7 +378,7 @@ def get_build_numbers(job_dir, before, indirect):
                 reverse=True)
     if indirect:
         # find numbered builds
-        builds = [re.search(r'/(\d*)\.txt$', f.filename)
+        builds = [BUILD_NUMBER_TXT_RE.search(f.filename)
                   for f in fstats if not f.is_dir]
         builds = [m.group(1) for m in builds if m]
     else:
@@ -378,10 +440,21 @@ def build_list(job_dir, before):
     build_refs = models.GHIssueDigest.find_xrefs_multi_async(
             [b[1] for b in build_futures])
 
-    output = []
-    for build, loc, started_future, finished_future in build_futures:
-        started, finished = normalize_metadata(started_future, finished_future)
-        output.append((str(build), loc, started, finished))
+    # Decode each build's metadata as soon as both of its reads are done, so
+    # decoding overlaps the reads still in flight.
+    output = [None] * len(build_futures)
+    pending = list(enumerate(build_futures))
+    while pending:
+        ndb.Future.wait_any([future for _, b in pending for future in b[2:]
+                             if not future.done()])
+        waiting = []
+        for n, (build, loc, started_future, finished_future) in pending:
+            if started_future.done() and finished_future.done():
+                started, finished = normalize_metadata(started_future, finished_future)
+                output[n] = (str(build), loc, started, finished)
+            else:
+                waiting.append((n, (build, loc, started_future, finished_future)))
+        pending = waiting
 
     return output, build_refs.get_result()
 
@@ -12,14 +12,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
 import os
 import unittest
 
 import cloudstorage as gcs
 
+import view_base
 import view_build
 
 import main_test
+import gcs_async
 import gcs_async_test
 import github.models
 import testgrid_test
@@ -373,6 +376,32 @@ class BuildTest(main_test.TestBase):
         response2 = self.get_build_page()
         self.assertEqual(str(response), str(response2))
 
+    def test_build_details_finished(self):
+        """Test that finished builds are also cached by finished.json hash."""
+        build_dir = self.BUILD_DIR.rstrip('/')
+        details = view_build.build_details(build_dir)
+        self.assertEqual(details[1]['result'], 'SUCCESS')
+        finished_sha1 = hashlib.sha1(
+            gcs_async.read(build_dir + '/finished.json').get_result()).hexdigest()
+        self.assertEqual(
+            view_base.memcache_get(view_build.FINISHED_DETAILS_PREFIX,
+                                   (build_dir, False, finished_sha1)),
+            details)
+
+    def test_build_details_unfinished(self):
+        """Test that unfinished builds aren't cached by finished.json hash."""
+        build_dir = '/kubernetes-jenkins/logs/job-still-running/1234'
+        init_build(build_dir + '/', finished=False)
+        details = view_build.build_details(build_dir)
+        self.assertIsNone(details[1])
+        self.assertEqual(len(details[2]['failed']), 1)
+        init_build(build_dir + '/')
+        finished_sha1 = hashlib.sha1(
+            gcs_async.read(build_dir + '/finished.json').get_result()).hexdigest()
+        self.assertIsNone(
+            view_base.memcache_get(view_build.FINISHED_DETAILS_PREFIX,
+                                   (build_dir, False, finished_sha1)))
+
     def test_build_directory_redir(self):
         build_dir = '/kubernetes-jenkins/pr-logs/directory/somejob/1234'
         target_dir = '/kubernetes-jenkins/pr-logs/pull/45/somejob/1234'
@@ -72,10 +72,40 @@ def get_all_logs(directory, artifacts):
     return log_files
 
 
-def parse_log_file(log_filename, pod, filters=None, make_dict=False, objref_dict=None):
-    """Based on make_dict, either returns the objref_dict or the parsed log file"""
+def read_log_lines(log_filename, lines_cache=None, keep=False):
+    """
+    Returns the escaped lines of log_filename, or None if it can't be read.
+
+    Unless keep is set, the log is truncated first, as log_parser.digest
+    does. With keep, all of the log's lines are returned, and logs short
+    enough to not be truncated are kept in lines_cache so a later digest
+    of the same file can pop them instead of reading, escaping, and
+    splitting it again.
+    """
+    if lines_cache and log_filename in lines_cache:
+        return lines_cache.pop(log_filename)
     log = gcs_async.read(log_filename).get_result()
     if log is None:
+        return None
+    log = log.decode('utf8', 'replace')
+    if not keep:
+        return log_parser.escape_lines(log_parser.truncate(log))
+    lines = log_parser.escape_lines(log)
+    if lines_cache is not None and len(log) <= log_parser.MAX_BUFFER:
+        lines_cache[log_filename] = lines
+    return lines
+
+
+def parse_log_file(log_filename, pod, filters=None, make_dict=False, objref_dict=None,
+                   lines_cache=None):
+    # pylint: disable=too-many-arguments
+    """
+    Based on make_dict, either returns the objref_dict or the parsed log file.
+
+    The make_dict pass keeps its lines in lines_cache for the digest after it.
+    """
+    lines = read_log_lines(log_filename, lines_cache, keep=bool(make_dict and pod))
+    if lines is None:
         return {}, False if make_dict else None
     if pod:
         bold_re = regex.wordRE(pod)
@@ -84,9 +114,9 @@ def parse_log_file(log_filename, pod, filters=None, make_dict=False, objref_dict
     if objref_dict is None:
         objref_dict = {}
     if make_dict and pod:
-        return kubelet_parser.make_dict(log.decode('utf8', 'replace'), bold_re, objref_dict)
+        return kubelet_parser.make_dict_lines(lines, bold_re, objref_dict)
     else:
-        return log_parser.digest(log.decode('utf8', 'replace'),
+        return log_parser.digest_lines(lines,
             error_re=bold_re, filters=filters, objref_dict=objref_dict)
 
 
@@ -100,12 +130,14 @@ def get_logs_junit((log_files, pod_name, filters, objref_dict, apiserver_filenam
 
     artifact_filename = os.path.dirname(apiserver_filename)
     all_logs = get_all_logs(artifact_filename, False)
+    lines_cache = {}
     parsed_dict, _ = parse_log_file(os.path.join(artifact_filename, "kubelet.log"),
-        pod_name, make_dict=True, objref_dict=objref_dict)
+        pod_name, make_dict=True, objref_dict=objref_dict, lines_cache=lines_cache)
     objref_dict.update(parsed_dict)
     if log_files:
         for log_file in log_files:
-            parsed_file = parse_log_file(log_file, pod_name, filters, objref_dict=objref_dict)
+            parsed_file = parse_log_file(log_file, pod_name, filters, objref_dict=objref_dict,
+                lines_cache=lines_cache)
             if parsed_file:
                 results[log_file] = parsed_file
 
@@ -150,10 +182,11 @@ def get_logs(build_dir, log_files, pod_name, filters, objref_dict):
     if not pod_name and not objref_dict:
         return get_logs_no_pod(apiserver_filename, kubelet_filenames, filters,
             objref_dict, all_logs)
+    lines_cache = {}
     for kubelet_log in kubelet_filenames:
         if pod_name:
             parsed_dict, pod_in_file = parse_log_file(kubelet_log, pod_name, make_dict=True,
-                objref_dict=objref_dict)
+                objref_dict=objref_dict, lines_cache=lines_cache)
             objref_dict.update(parsed_dict)
         if len(objref_dict) > old_dict_len or not pod_name or pod_in_file or not objref_dict:
             if log_files == []:
@@ -162,10 +195,12 @@ def get_logs(build_dir, log_files, pod_name, filters, objref_dict):
                     log_files.extend(apiserver_filename)
             for log_file in log_files:
                 parsed_file = parse_log_file(log_file, pod_name, filters,
-                    objref_dict=objref_dict)
+                    objref_dict=objref_dict, lines_cache=lines_cache)
                 if parsed_file:
                     results[log_file] = parsed_file
             break
+        # This log won't be digested, so don't hold on to its lines.
+        lines_cache.pop(kubelet_log, None)
 
     return all_logs, results, objref_dict, log_files
 
@@ -0,0 +1,80 @@
+# Copyright 2016 The Kubernetes Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import cloudstorage as gcs
+
+import gcs_async_test
+import log_parser
+import main_test
+import regex
+import view_logs
+
+write = gcs_async_test.write
+
+KUBELET_LOG = '''line 0
+pod abc is starting
+Event(api.ObjectReference{Kind:"Pod", Namespace:"ns", Name:"abc", UID:"uid"})
+pod abc failed
+line 4'''
+
+
+class ParseLogFileTest(main_test.TestBase):
+    LOG = '/kubernetes-jenkins/logs/somejob/1234/artifacts/tmp-node-a/kubelet.log'
+    FILTERS = {'UID': '', 'pod': 'abc', 'Namespace': '', 'ContainerID': ''}
+
+    def setUp(self):
+        self.init_stubs()
+        write(self.LOG, KUBELET_LOG)
+
+    def digest(self, objref_dict):
+        return log_parser.digest(KUBELET_LOG, error_re=regex.wordRE('abc'),
+                                 filters=self.FILTERS, objref_dict=objref_dict)
+
+    def test_missing(self):
+        """Test that a missing log parses to nothing."""
+        missing = self.LOG.replace('kubelet.log', 'missing.log')
+        self.assertIsNone(view_logs.parse_log_file(missing, 'abc', self.FILTERS))
+        self.assertEqual(
+            view_logs.parse_log_file(missing, 'abc', make_dict=True), ({}, False))
+
+    def test_digest(self):
+        """Test that a log without the objref pass is digested like build logs."""
+        lines_cache = {}
+        parsed = view_logs.parse_log_file(self.LOG, 'abc', self.FILTERS,
+                                          objref_dict={}, lines_cache=lines_cache)
+        self.assertEqual(parsed, self.digest({}))
+        self.assertEqual(lines_cache, {})
+
+    def test_objref_then_digest(self):
+        """Test that the digest after the objref pass reuses the same lines."""
+        lines_cache = {}
+        objref_dict, pod_in_file = view_logs.parse_log_file(
+            self.LOG, 'abc', make_dict=True, objref_dict={}, lines_cache=lines_cache)
+        self.assertTrue(pod_in_file)
+        self.assertEqual(objref_dict,
+                         {'Kind': 'Pod', 'Namespace': 'ns', 'Name': 'abc', 'UID': 'uid'})
+        self.assertIn(self.LOG, lines_cache)
+
+        # The kept lines must be used instead of reading the log again.
+        gcs.delete(self.LOG)
+        parsed = view_logs.parse_log_file(self.LOG, 'abc', self.FILTERS,
+                                          objref_dict=objref_dict, lines_cache=lines_cache)
+        self.assertEqual(parsed, self.digest(objref_dict))
+        self.assertEqual(lines_cache, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
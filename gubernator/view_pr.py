@@ -13,11 +13,16 @@
 # limitations under the License.
 
 import datetime
+import hashlib
 import json
 import logging
+import operator
 import os
 import time
 
+from google.appengine.api import memcache
+import google.appengine.ext.ndb as ndb
+
 import filters
 import gcs_async
 import github.models as ghm
@@ -26,6 +31,24 @@ import view_base
 import view_build
 
 
+MEMCACHE_NAMESPACE = os.environ['CURRENT_VERSION_ID']
+
+# Finished builds don't change, so their metadata is cached indefinitely.
+BUILD_METADATA_PREFIX = 'pr-build-metadata://'
+
+# Dashboards that aren't personalized for the viewer are shared briefly.
+DASHBOARD_PREFIX = 'pr-dashboard://'
+DASHBOARD_EXPIRES = 30
+
+# pylint: disable=singleton-comparison
+_PR_QUERY = ghm.GHIssueDigest.query(ghm.GHIssueDigest.is_pr == True)
+_OPEN_PR_QUERY = _PR_QUERY.filter(ghm.GHIssueDigest.is_open == True)
+
+# Fields emitted for each PR in the dashboard's JSON format.
+# pylint: disable=protected-access
+_DIGEST_KEYS = ('repo', 'number') + tuple(sorted(ghm.GHIssueDigest._properties))
+
+
 @view_base.memcache_memoize('pr-details://', expires=60 * 3)
 def pr_builds(path):
     """Return {job: [(build, {started.json}, {finished.json})]} for each job under gcs path."""
@@ -35,23 +58,62 @@ def pr_builds(path):
         return os.path.basename(os.path.dirname(path))
 
     jobs_futures = [(job, gcs_async.listdirs(job)) for job in jobs_dirs_fut.get_result()]
-    futures = []
+    cache_rpcs = []
+
+    # Look up each job's cached metadata as soon as its build listing
+    # arrives, rather than waiting on the listings in order.
+    while jobs_futures:
+        ndb.Future.wait_any([builds_fut for _, builds_fut in jobs_futures])
+        waiting = []
+        for job, builds_fut in jobs_futures:
+            if not builds_fut.done():
+                waiting.append((job, builds_fut))
+                continue
+            builds = builds_fut.get_result()
+            cache_rpcs.append((job, builds, memcache.get_multi_async(
+                builds, key_prefix=BUILD_METADATA_PREFIX, namespace=MEMCACHE_NAMESPACE)))
+        jobs_futures = waiting
 
-    for job, builds_fut in jobs_futures:
-        for build in builds_fut.get_result():
+    futures = []
+    for job, builds, cache_rpc in cache_rpcs:
+        cached = cache_rpc.get_result()
+        for build in builds:
+            # The padded build number is the secondary sort key.
+            build_key = view_base.pad_numbers(base(build))
+            if build in cached:
+                futures.append([base(job), build_key, base(build), build,
+                                cached[build], None, None])
+                continue
             futures.append([
                 base(job),
+                build_key,
                 base(build),
+                build,
+                None,
                 gcs_async.read('/%sstarted.json' % build),
                 gcs_async.read('/%sfinished.json' % build)])
 
-    futures.sort(key=lambda (job, build, s, f): (job, view_base.pad_numbers(build)), reverse=True)
+    futures.sort(key=operator.itemgetter(0, 1), reverse=True)
 
     jobs = {}
-    for job, build, started_fut, finished_fut in futures:
-        started, finished = view_build.normalize_metadata(started_fut, finished_fut)
+    finished_builds = {}
+    for job, _, build, build_path, cached_metadata, started_fut, finished_fut in futures:
+        if cached_metadata:
+            started, finished = cached_metadata
+        else:
+            started, finished = view_build.normalize_metadata(started_fut, finished_fut)
+            if finished:
+                finished_builds[build_path] = (started, finished)
         jobs.setdefault(job, []).append((build, started, finished))
 
+    # finished.json is written once, when a build completes, and a build's
+    # started.json is already in place by then. So the metadata of finished
+    # builds can be cached with no expiry and never re-read from GCS, while
+    # running builds are looked up again on every call.
+    if finished_builds:
+        memcache.set_multi(finished_builds, key_prefix=BUILD_METADATA_PREFIX,
+                           namespace=MEMCACHE_NAMESPACE)
+
     return jobs
 
 
@@ -97,22 +159,23 @@ class PRHandler(view_base.BaseHandler):
             default_org=self.app.config['default_org'],
             default_repo=self.app.config['default_repo'],
         )
+        # Fetch the PR's digest while the builds are read from GCS.
+        digest_fut = ghm.GHIssueDigest.make_key('%s/%s' % (org, repo), pr).get_async()
         builds = pr_builds(path)
         # TODO(fejta): assume all builds are monotonically increasing.
-        for bs in builds.itervalues():
+        for bs in builds.values():
             if any(len(b) > 8 for b, _, _ in bs):
-                bs.sort(key=lambda (b, s, f): -(s or {}).get('timestamp', 0))
+                bs.sort(key=lambda b: -(b[1] or {}).get('timestamp', 0))
         if pr == 'batch':  # truncate batch results to last day
             cutoff = time.time() - 60 * 60 * 24
-            builds = {}
-            for job, job_builds in builds.iteritems():
-                builds[job] = [
+            for job_builds in builds.values():
+                job_builds[:] = [
                     (b, s, f) for b, s, f in job_builds
                     if not s or s.get('timestamp') > cutoff
                 ]
 
         max_builds, headings, rows = pull_request.builds_to_table(builds)
-        digest = ghm.GHIssueDigest.get('%s/%s' % (org, repo), pr)
+        digest = digest_fut.get_result()
         self.render(
             'pr.html',
             dict(
@@ -128,9 +191,15 @@ class PRHandler(view_base.BaseHandler):
         )
 
 
-def get_acks(login, prs):
+def get_acks(login, prs, state_future=None):
+    """Returns login's acks, clearing any for PRs not in prs.
+
+    state_future is an optional pending GHUserState get for login.
+    """
     acks = {}
-    result = ghm.GHUserState.make_key(login).get()
+    if state_future is None:
+        state_future = ghm.GHUserState.make_key(login).get_async()
+    result = state_future.get_result()
     if result:
         acks = result.acks
         if prs:
@@ -147,16 +216,29 @@ class InsensitiveString(str):
     """A string that uses str.lower() to compare itself to others.
 
     Does not override __in__ (that uses hash()) or sorting."""
+    def __new__(cls, value):
+        obj = str.__new__(cls, value)
+        obj.lowered = value.lower()
+        return obj
+
     def __eq__(self, other):
         try:
-            return other.lower() == self.lower()
+            return other.lower() == self.lowered
         except AttributeError:
             return str.__eq__(self, other)
 
 
+def _pr_json_default(obj):
+    """Serialize the values the dashboard's JSON format needs."""
+    if isinstance(obj, datetime.datetime):
+        return obj.isoformat()
+    elif isinstance(obj, ghm.GHIssueDigest):
+        return {k: getattr(obj, k) for k in _DIGEST_KEYS}
+    raise TypeError
+
+
 class PRDashboard(view_base.BaseHandler):
     def get(self, user=None):
-        # pylint: disable=singleton-comparison
         login = self.session.get('user')
         if not user:
             user = login
@@ -166,30 +248,44 @@ class PRDashboard(view_base.BaseHandler):
             logging.debug('user=%s', user)
         elif user == 'all':
             user = None
-        qs = [ghm.GHIssueDigest.is_pr == True]
-        if not self.request.get('all', False):
-            qs.append(ghm.GHIssueDigest.is_open == True)
+
+        fmt = self.request.get('format', 'html')
+        if fmt not in ('json', 'html'):
+            self.abort(406)
+
+        # Only the user's own page shows acks, so any other view can be shared.
+        cache_key = None
+        if not (login and user == login):
+            cache_key = '%s%s' % (DASHBOARD_PREFIX, (
+                user, bool(self.request.get('all', False)), self.request.get('milestone'), fmt))
+            body = memcache.get(cache_key, namespace=MEMCACHE_NAMESPACE)
+            if body is not None:
+                if fmt == 'json':
+                    self.response.headers['Content-Type'] = 'application/json'
+                self.response.write(body)
+                return
+
+        query = _PR_QUERY if self.request.get('all', False) else _OPEN_PR_QUERY
         if user:
-            qs.append(ghm.GHIssueDigest.involved == user.lower())
-        prs = list(ghm.GHIssueDigest.query(*qs).fetch(batch_size=200))
-        prs.sort(key=lambda x: x.updated_at, reverse=True)
+            query = query.filter(ghm.GHIssueDigest.involved == user.lower())
+        prs_fut = query.fetch_async(batch_size=200)
 
-        acks = None
+        # Look up the user's acks while the query runs.
+        state_fut = None
         if login and user == login:  # user getting their own page
-            acks = get_acks(login, prs)
+            state_fut = ghm.GHUserState.make_key(login).get_async()
+
+        prs = prs_fut.get_result()
+        prs.sort(key=operator.attrgetter('updated_at'), reverse=True)
+
+        acks = None
+        if state_fut:
+            acks = get_acks(login, prs, state_fut)
 
-        fmt = self.request.get('format', 'html')
         if fmt == 'json':
             self.response.headers['Content-Type'] = 'application/json'
-            def serial(obj):
-                if isinstance(obj, datetime.datetime):
-                    return obj.isoformat()
-                elif isinstance(obj, ghm.GHIssueDigest):
-                    # pylint: disable=protected-access
-                    keys = ['repo', 'number'] + list(obj._values)
-                    return {k: getattr(obj, k) for k in keys}
-                raise TypeError
-            self.response.write(json.dumps(prs, sort_keys=True, default=serial, indent=True))
+            self.response.write(json.dumps(prs, sort_keys=True, default=_pr_json_default,
+                                           indent=True))
         elif fmt == 'html':
             if user:
                 user = InsensitiveString(user)
@@ -203,7 +299,7 @@ class PRDashboard(view_base.BaseHandler):
                     return filters.do_get_latest(p.payload, user) <= acks.get(p.key.id(), 0)
                 def needs_attention(p):
                     labels = p.payload.get('labels', {})
-                    for u, reason in p.payload['attn'].iteritems():
+                    for u, reason in p.payload['attn'].items():
                         if user == u:  # case insensitive compare
                             if acked(p):
                                 continue  # hide acked PRs
@@ -231,11 +327,20 @@ class PRDashboard(view_base.BaseHandler):
             if milestone:
                 prs = [pr for pr in prs if pr.payload.get('milestone') == milestone]
 
+            # Bucket the PRs here rather than filtering them in the template.
+            cats = [(title, [p for p in prs if pred(p)], search)
+                    for title, pred, search in cats]
+
             self.render('pr_dashboard.html', dict(
                 prs=prs, cats=cats, user=user, login=login, acks=acks,
                 milestone=milestone, milestones=milestones))
-        else:
-            self.abort(406)
+
+        if cache_key:
+            try:
+                memcache.set(cache_key, self.response.body, DASHBOARD_EXPIRES,
+                             namespace=MEMCACHE_NAMESPACE)
+            except ValueError:
+                logging.exception('unable to write dashboard to memcache')
 
     def post(self):
         login = self.session.get('user')
@@ -262,6 +367,15 @@ class PRBuildLogHandler(view_base.BaseHandler):
             default_org=self.app.config['default_org'],
             default_repo=self.app.config['default_repo'],
         )
-        self.redirect('https://storage.googleapis.com/%s/%s' % (
+        url = 'https://storage.googleapis.com/%s/%s' % (
             get_pull_prefix(self.app.config, org), path
-        ))
+        )
+        # The target only depends on the path and app config, and this handler
+        # never touches the session, so shared caches may keep the redirect.
+        etag = '"%s"' % hashlib.md5(url.encode('utf-8')).hexdigest()
+        self.response.headers['Cache-Control'] = 'public, max-age=3600'
+        self.response.headers['ETag'] = etag
+        if self.request.headers.get('If-None-Match') == etag:
+            self.response.status_int = 304
+            return
+        self.redirect(url)
@@ -17,6 +17,10 @@
 import datetime
 import unittest
 
+import cloudstorage as gcs
+
+from google.appengine.api import memcache
+
 # TODO(fejta): use non-relative imports
 # https://google.github.io/styleguide/pyguide.html?showone=Packages#Packages
 import gcs_async_test
@@ -87,19 +91,52 @@ class PRTest(main_test.TestBase):
                 if finished:
                     write(path + 'finished.json', finished)
 
-    def test_pr_builds(self):
-        self.init_pr_directory()
+    def get_pr_builds(self):
         org, repo = view_pr.org_repo('',
             app.app.config['default_org'],
             app.app.config['default_repo'],
         )
-        builds = view_pr.pr_builds(view_pr.pr_path(org, repo, '123',
+        return view_pr.pr_builds(view_pr.pr_path(org, repo, '123',
             app.app.config['default_repo'],
             app.app.config['default_repo'],
             app.app.config['default_external_services']['gcs_pull_prefix'],
         ))
+
+    def test_pr_builds(self):
+        self.init_pr_directory()
+        builds = self.get_pr_builds()
         self.assertEqual(builds, self.BUILDS)
 
+    def test_pr_builds_cached(self):
+        """Test that only finished builds' metadata is cached and reused."""
+        self.init_pr_directory()
+        self.assertEqual(self.get_pr_builds(), self.BUILDS)
+
+        paths = {}
+        for job, builds in self.BUILDS.iteritems():
+            for build, _, finished in builds:
+                paths[(job, build)] = (
+                    'kubernetes-jenkins/pr-logs/pull/123/%s/%s/' % (job, build), finished)
+        cached = memcache.get_multi([path for path, _ in paths.itervalues()],
+                                    key_prefix=view_pr.BUILD_METADATA_PREFIX,
+                                    namespace=view_pr.MEMCACHE_NAMESPACE)
+        self.assertEqual(sorted(cached),
+                         sorted(path for path, finished in paths.itervalues() if finished))
+
+        # Finished builds must now come from memcache, not GCS, while the
+        # running build is read again and picks up its new finished.json.
+        for path, finished in paths.itervalues():
+            if finished:
+                gcs.delete('/%sstarted.json' % path)
+                gcs.delete('/%sfinished.json' % path)
+        running_finished = {'result': 'PASSED', 'passed': True}
+        write('/%sfinished.json' % paths[('build', '12')][0], running_finished)
+
+        expected = dict(self.BUILDS)
+        expected['build'] = [(build, started, running_finished if build == '12' else finished)
+                             for build, started, finished in expected['build']]
+        self.assertEqual(self.get_pr_builds(), expected)
+
     def test_pr_handler(self):
         self.init_pr_directory()
         response = app.get('/pr/123')
@@ -121,6 +158,10 @@ class PRTest(main_test.TestBase):
         self.assertEqual(response.status_code, 302)
         self.assertIn('https://storage.googleapis.com', response.location)
         self.assertIn(path, response.location)
+        self.assertIn('max-age', response.headers['Cache-Control'])
+        response = app.get('/pr/' + path,
+            headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
 
 
 def make_pr(number, involved, payload, repo='kubernetes/kubernetes'):
@@ -162,6 +203,21 @@ class TestDashboard(main_test.TestBase):
         self.assertEqual(pr['number'], 12)
         self.assertEqual(pr['repo'], 'c/d')
 
+    def test_cached(self):
+        "Shared dashboards are briefly cached."
+        make_pr(12, ['foo'], {'title': 'first'})
+        resp = app.get('/pr/all')
+        self.assertIn('first', resp)
+        make_pr(13, ['bar'], {'title': 'second'})
+        resp = app.get('/pr/all')
+        self.assertNotIn('second', resp)
+        resp = app.get('/pr/all?format=json')
+        self.assertEqual(resp.headers['Content-Type'], 'application/json')
+        self.assertEqual(len(resp.json), 2)
+        resp = app.get('/pr/all?format=json')
+        self.assertEqual(resp.headers['Content-Type'], 'application/json')
+        self.assertEqual(len(resp.json), 2)
+
     def test_one_entry(self):
         make_pr(123, ['user'], {'attn': {'user': 'fix tests'}})
         resp = app.get('/pr/user')
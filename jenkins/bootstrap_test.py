@@ -19,9 +19,12 @@
 # pylint: disable=protected-access, attribute-defined-outside-init
 
 import argparse
+import contextlib
 import json
 import os
 import select
+import shlex
+import shutil
 import signal
 import subprocess
 import tempfile
@@ -45,6 +48,8 @@ UPLOAD = 'fake-gs://fake-bucket'
 
 class Stub(object):
     """Replace thing.param with replacement until exiting with."""
+    __slots__ = ('thing', 'param', 'replacement', 'old')
+
     def __init__(self, thing, param, replacement):
         self.thing = thing
         self.param = param
@@ -59,7 +64,17 @@ class Stub(object):
         setattr(self.thing, self.param, self.old)
 
 
+def stub_until_cleanup(test, *stubs):
+    """Keep stubs in place until test's cleanups run, restoring them in reverse."""
+    stack = contextlib.ExitStack()
+    test.addCleanup(stack.close)
+    for stub in stubs:
+        stack.enter_context(stub)
+
+
 class FakeCall(object):
+    __slots__ = ('calls',)
+
     def __init__(self):
         self.calls = []
 
@@ -69,6 +84,8 @@ class FakeCall(object):
 
 class FakeSubprocess(object):
     """Keep track of calls."""
+    __slots__ = ('calls', 'file_data', 'output')
+
     def __init__(self):
         self.calls = []
         self.file_data = []
@@ -78,11 +95,16 @@ class FakeSubprocess(object):
         self.calls.append((cmd, a, kw))
         for arg in cmd:
             if arg.startswith('/') and os.path.exists(arg):
-                self.file_data.append(open(arg).read())
+                with open(arg) as fp:
+                    self.file_data.append(fp.read())
         if kw.get('output') and self.output.get(cmd[0]):
             return self.output[cmd[0]].pop(0)
         return None
 
+    def commands(self, arg):
+        """Return the recorded commands which include arg."""
+        return [cmd for cmd, _, _ in self.calls if arg in cmd]
+
 
 # pylint: disable=invalid-name
 def Pass(*_a, **_kw):
@@ -331,9 +353,9 @@ class CheckoutTest(unittest.TestCase):
             bootstrap.checkout(fake, REPO, REPO, None, PULL, clean=True)
 
         self.assertTrue(any(
-            'clean' in cmd for cmd, _, _ in fake.calls if 'git' in cmd))
+            'clean' in cmd for cmd in fake.commands('git')))
         self.assertTrue(any(
-            'reset' in cmd for cmd, _, _ in fake.calls if 'git' in cmd))
+            'reset' in cmd for cmd in fake.commands('git')))
 
     def test_fetch_retries(self):
         self.tries = 0
@@ -357,7 +379,7 @@ class CheckoutTest(unittest.TestCase):
 
         expected_ref = bootstrap.pull_ref(PULL)[0][0]
         self.assertTrue(any(
-            expected_ref in cmd for cmd, _, _ in fake.calls if 'fetch' in cmd))
+            expected_ref in cmd for cmd in fake.commands('fetch')))
 
     def test_branch(self):
         """checkout fetches the right ref for a branch."""
@@ -367,7 +389,7 @@ class CheckoutTest(unittest.TestCase):
 
         expected_ref = BRANCH
         self.assertTrue(any(
-            expected_ref in cmd for cmd, _, _ in fake.calls if 'fetch' in cmd))
+            expected_ref in cmd for cmd in fake.commands('fetch')))
 
     def test_repo(self):
         """checkout initializes and fetches the right repo."""
@@ -377,7 +399,7 @@ class CheckoutTest(unittest.TestCase):
 
         expected_uri = 'https://%s' % REPO
         self.assertTrue(any(
-            expected_uri in cmd for cmd, _, _ in fake.calls if 'fetch' in cmd))
+            expected_uri in cmd for cmd in fake.commands('fetch')))
 
     def test_branch_xor_pull(self):
         """Either branch or pull specified, not both."""
@@ -394,10 +416,9 @@ class CheckoutTest(unittest.TestCase):
             bootstrap.checkout(fake, REPO, REPO, BRANCH, None)
 
         self.assertTrue(any(
-            '--tags' in cmd for cmd, _, _ in fake.calls if 'fetch' in cmd))
+            '--tags' in cmd for cmd in fake.commands('fetch')))
         self.assertTrue(any(
-            'FETCH_HEAD' in cmd for cmd, _, _ in fake.calls
-            if 'checkout' in cmd))
+            'FETCH_HEAD' in cmd for cmd in fake.commands('checkout')))
 
     def test_repo_path(self):
         """checkout repo to different local path."""
@@ -408,10 +429,10 @@ class CheckoutTest(unittest.TestCase):
 
         expected_uri = 'https://%s' % REPO
         self.assertTrue(any(
-            expected_uri in cmd for cmd, _, _ in fake.calls if 'fetch' in cmd))
+            expected_uri in cmd for cmd in fake.commands('fetch')))
 
         self.assertTrue(any(
-            repo_path in cmd for cmd, _, _ in fake.calls if 'init' in cmd))
+            repo_path in cmd for cmd in fake.commands('init')))
 
 class ParseReposTest(unittest.TestCase):
     def test_bare(self):
@@ -673,30 +694,29 @@ class AppendResultTest(unittest.TestCase):
         try_run('true')
 
     def test_truncate(self):
-        old = json.dumps({n: True for n in range(100000)})
+        old = [{'buildnumber': n} for n in range(400)]
         gsutil = FakeGSUtil()
         build = 123
         version = 'v.interesting'
         success = True
-        bootstrap.append_result(gsutil, 'fake_path', build, version, success)
+        with Stub(gsutil, 'cat', lambda *a, **kw: json.dumps(old)):
+            bootstrap.append_result(gsutil, 'fake_path', build, version, success)
         cache = gsutil.jsons[0][0][1]
         self.assertLess(len(cache), len(old))
+        self.assertEqual(old[-len(cache) + 1:], cache[:-1])
+        self.assertEqual(build, cache[-1]['buildnumber'])
 
 
 class FinishTest(unittest.TestCase):
     """Tests for finish()."""
     def setUp(self):
-        self.stubs = [
+        stub_until_cleanup(
+            self,
             Stub(bootstrap.GSUtil, 'upload_artifacts', Pass),
             Stub(bootstrap, 'append_result', Pass),
             Stub(os.path, 'isfile', Pass),
             Stub(os.path, 'isdir', Pass),
-        ]
-
-    def tearDown(self):
-        for stub in self.stubs:
-            with stub:
-                pass
+        )
 
     def test_no_version(self):
         gsutil = FakeGSUtil()
@@ -818,22 +838,31 @@ class MetadataTest(unittest.TestCase):
 SECONDS = 10
 
 
+FAKE_ENVIRONMENT = {
+    bootstrap.HOME_ENV: '/fake/home-dir',
+    bootstrap.NODE_ENV: 'fake-node',
+    bootstrap.JOB_ENV: JOB,
+    bootstrap.JENKINS_HOME_ENV: '/fake/home-dir',
+    bootstrap.WORKSPACE_ENV: '/fake/workspace',
+    bootstrap.JOB_ARTIFACTS_ENV: '/fake/workspace/_artifacts',
+}
+
+
 def fake_environment(set_home=True, set_node=True, set_job=True,
                      set_jenkins_home=True, set_workspace=True,
                      set_artifacts=True, **kwargs):
-    if set_home:
-        kwargs.setdefault(bootstrap.HOME_ENV, '/fake/home-dir')
-    if set_node:
-        kwargs.setdefault(bootstrap.NODE_ENV, 'fake-node')
-    if set_job:
-        kwargs.setdefault(bootstrap.JOB_ENV, JOB)
-    if set_jenkins_home:
-        kwargs.setdefault(bootstrap.JENKINS_HOME_ENV, '/fake/home-dir')
-    if set_workspace:
-        kwargs.setdefault(bootstrap.WORKSPACE_ENV, '/fake/workspace')
-    if set_artifacts:
-        kwargs.setdefault(bootstrap.JOB_ARTIFACTS_ENV, '/fake/workspace/_artifacts')
-    return kwargs
+    env = dict(FAKE_ENVIRONMENT)
+    for key, wanted in (
+            (bootstrap.HOME_ENV, set_home),
+            (bootstrap.NODE_ENV, set_node),
+            (bootstrap.JOB_ENV, set_job),
+            (bootstrap.JENKINS_HOME_ENV, set_jenkins_home),
+            (bootstrap.WORKSPACE_ENV, set_workspace),
+            (bootstrap.JOB_ARTIFACTS_ENV, set_artifacts)):
+        if not wanted:
+            del env[key]
+    env.update(kwargs)
+    return env
 
 
 class BuildNameTest(unittest.TestCase):
@@ -1104,7 +1133,8 @@ def test_bootstrap(**kw):
 class BootstrapTest(unittest.TestCase):
 
     def setUp(self):
-        self.boiler = [
+        stub_until_cleanup(
+            self,
             Stub(bootstrap, 'checkout', Pass),
             Stub(bootstrap, 'finish', Pass),
             Stub(bootstrap.GSUtil, 'copy_file', Pass),
@@ -1116,13 +1146,7 @@ class BootstrapTest(unittest.TestCase):
             Stub(os, 'environ', fake_environment()),
             Stub(os, 'chdir', Pass),
             Stub(os, 'makedirs', Pass),
-        ]
-
-    def tearDown(self):
-        for stub in self.boiler:
-            with stub:  # Leaving with restores things
-                pass
-
+        )
 
     def test_compress(self):
         compressed = lambda s, d, o, c: self.assertTrue(c, 'failed to find compression')
@@ -1275,8 +1299,45 @@ class IntegrationTest(unittest.TestCase):
     def fake_repo(self, fake, _ssh=False):
         return os.path.join(self.root_github, fake)
 
+    @staticmethod
+    def run_script(*commands):
+        """Run commands in a single shell, stopping at the first failure."""
+        subprocess.check_call(['bash', '-ec', '\n'.join(commands)])
+
+    def commit_branch(self, branch, new_file, message, start='', extra=()):
+        """Replace MASTER with new_file on a new branch and commit it."""
+        self.run_script(
+            'git checkout -q -b %s %s' % (shlex.quote(branch), start),
+            'git rm -q %s' % self.MASTER,
+            'touch %s' % new_file,
+            'git add %s' % new_file,
+            *extra,
+            'git commit -q -m %s' % shlex.quote(message))
+
+    @classmethod
+    def setUpClass(cls):
+        # Each test starts from a copy of this repo with the initial commit.
+        cls.template = tempfile.mkdtemp()
+        template = shlex.quote(cls.template)
+        cls.run_script(
+            'git init -q %s' % template,
+            'cd %s' % template,
+            'git config user.name foo',
+            'git config user.email foo@bar.baz',
+            'touch %s' % cls.MASTER,
+            'cp -r %s .' % shlex.quote(bootstrap.test_infra('jenkins/fake')),
+            'git add %s fake' % cls.MASTER,
+            'git commit -q -m "Initial commit"',
+            'git checkout -q master',
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.template, ignore_errors=True)
+
     def setUp(self):
-        self.boiler = [
+        stub_until_cleanup(
+            self,
             Stub(bootstrap, 'finish', Pass),
             Stub(bootstrap.GSUtil, 'copy_file', Pass),
             Stub(bootstrap, 'repository', self.fake_repo),
@@ -1284,38 +1345,23 @@ class IntegrationTest(unittest.TestCase):
             Stub(bootstrap, 'setup_logging', FakeLogging()),
             Stub(bootstrap, 'start', Pass),
             Stub(os, 'environ', fake_environment(set_job=False)),
-        ]
+        )
         self.root_github = tempfile.mkdtemp()
         self.root_workspace = tempfile.mkdtemp()
         self.root_git_cache = tempfile.mkdtemp()
         self.ocwd = os.getcwd()
         fakerepo = self.fake_repo(self.REPO)
-        subprocess.check_call(['git', 'init', fakerepo])
+        shutil.copytree(self.template, fakerepo, symlinks=True)
         os.chdir(fakerepo)
-        subprocess.check_call(['git', 'config', 'user.name', 'foo'])
-        subprocess.check_call(['git', 'config', 'user.email', 'foo@bar.baz'])
-        subprocess.check_call(['touch', self.MASTER])
-        subprocess.check_call(['git', 'add', self.MASTER])
-        subprocess.check_call(['cp', '-r', bootstrap.test_infra('jenkins/fake'), fakerepo])
-        subprocess.check_call(['git', 'add', 'fake'])
-        subprocess.check_call(['git', 'commit', '-m', 'Initial commit'])
-        subprocess.check_call(['git', 'checkout', 'master'])
 
     def tearDown(self):
-        for stub in self.boiler:
-            with stub:  # Leaving with restores things
-                pass
         os.chdir(self.ocwd)
-        subprocess.check_call(['rm', '-rf', self.root_github])
-        subprocess.check_call(['rm', '-rf', self.root_workspace])
-        subprocess.check_call(['rm', '-rf', self.root_git_cache])
+        shutil.rmtree(self.root_github, ignore_errors=True)
+        shutil.rmtree(self.root_workspace, ignore_errors=True)
+        shutil.rmtree(self.root_git_cache, ignore_errors=True)
 
     def test_git_cache(self):
-        subprocess.check_call(['git', 'checkout', '-b', self.BRANCH])
-        subprocess.check_call(['git', 'rm', self.MASTER])
-        subprocess.check_call(['touch', self.BRANCH_FILE])
-        subprocess.check_call(['git', 'add', self.BRANCH_FILE])
-        subprocess.check_call(['git', 'commit', '-m', 'Create %s' % self.BRANCH])
+        self.commit_branch(self.BRANCH, self.BRANCH_FILE, 'Create %s' % self.BRANCH)
         test_bootstrap(
             job='fake-branch',
             repo=self.REPO,
@@ -1329,12 +1375,8 @@ class IntegrationTest(unittest.TestCase):
             ['git', '--git-dir=%s/%s' % (self.root_git_cache, self.REPO), 'log'])
 
     def test_pr(self):
-        subprocess.check_call(['git', 'checkout', 'master'])
-        subprocess.check_call(['git', 'checkout', '-b', 'unknown-pr-branch'])
-        subprocess.check_call(['git', 'rm', self.MASTER])
-        subprocess.check_call(['touch', self.PR_FILE])
-        subprocess.check_call(['git', 'add', self.PR_FILE])
-        subprocess.check_call(['git', 'commit', '-m', 'Create branch for PR %d' % self.PR_NUM])
+        self.commit_branch(
+            'unknown-pr-branch', self.PR_FILE, 'Create branch for PR %d' % self.PR_NUM, 'master')
         subprocess.check_call(['git', 'tag', self.PR_TAG])
         os.chdir('/tmp')
         test_bootstrap(
@@ -1345,11 +1387,7 @@ class IntegrationTest(unittest.TestCase):
             root=self.root_workspace)
 
     def test_branch(self):
-        subprocess.check_call(['git', 'checkout', '-b', self.BRANCH])
-        subprocess.check_call(['git', 'rm', self.MASTER])
-        subprocess.check_call(['touch', self.BRANCH_FILE])
-        subprocess.check_call(['git', 'add', self.BRANCH_FILE])
-        subprocess.check_call(['git', 'commit', '-m', 'Create %s' % self.BRANCH])
+        self.commit_branch(self.BRANCH, self.BRANCH_FILE, 'Create %s' % self.BRANCH)
 
         os.chdir('/tmp')
         test_bootstrap(
@@ -1361,15 +1399,12 @@ class IntegrationTest(unittest.TestCase):
 
     def test_branch_ref(self):
         """Make sure we check out a specific commit."""
-        subprocess.check_call(['git', 'checkout', '-b', self.BRANCH])
-        subprocess.check_call(['git', 'rm', self.MASTER])
-        subprocess.check_call(['touch', self.BRANCH_FILE])
-        subprocess.check_call(['git', 'add', self.BRANCH_FILE])
-        subprocess.check_call(['git', 'commit', '-m', 'Create %s' % self.BRANCH])
+        self.commit_branch(self.BRANCH, self.BRANCH_FILE, 'Create %s' % self.BRANCH)
         sha = subprocess.check_output(['git', 'rev-parse', 'HEAD']).strip()
-        subprocess.check_call(['rm', self.BRANCH_FILE])
-        subprocess.check_call(['git', 'add', self.BRANCH_FILE])
-        subprocess.check_call(['git', 'commit', '-m', 'Delete %s' % self.BRANCH])
+        self.run_script(
+            'git rm -q %s' % self.BRANCH_FILE,
+            'git commit -q -m "Delete %s"' % self.BRANCH,
+        )
 
         os.chdir('/tmp')
         # Supplying the commit exactly works.
@@ -1411,13 +1446,12 @@ class IntegrationTest(unittest.TestCase):
         master_commit_date = int(subprocess.check_output(
             ['git', 'show', '-s', '--format=format:%ct', head_sha()]))
         for pr in (123, 456):
-            subprocess.check_call(['git', 'checkout', '-b', 'refs/pull/%d/head' % pr, 'master'])
-            subprocess.check_call(['git', 'rm', self.MASTER])
-            subprocess.check_call(['touch', self.PR_FILE])
-            subprocess.check_call(['git', 'add', self.PR_FILE])
-            open('pr_%d.txt' % pr, 'w').write('some text')
-            subprocess.check_call(['git', 'add', 'pr_%d.txt' % pr])
-            subprocess.check_call(['git', 'commit', '-m', 'add some stuff (#%d)' % pr])
+            self.commit_branch(
+                'refs/pull/%d/head' % pr, self.PR_FILE, 'add some stuff (#%d)' % pr,
+                'master', extra=(
+                    "printf 'some text' > pr_%d.txt" % pr,
+                    'git add pr_%d.txt' % pr,
+                ))
             refs.append('%d:%s' % (pr, head_sha()))
         os.chdir('/tmp')
         pull = ','.join(refs)
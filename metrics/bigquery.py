@@ -29,6 +29,9 @@ import traceback
 import requests
 import ruamel.yaml as yaml
 
+# The safe loader uses libyaml when ruamel.yaml's C extension is installed.
+SAFE_YAML = yaml.YAML(typ='safe')
+
 BACKFILL_DAYS = 30
 DEFAULT_JQ_BIN = '/usr/bin/jq'
 
@@ -166,7 +169,7 @@ def main(configs, project, bucket_path):
     for path in configs or all_configs():
         try:
             with open(path) as config_raw:
-                config = yaml.safe_load(config_raw)
+                config = SAFE_YAML.load(config_raw)
             if not config:
                 raise ValueError('invalid yaml: %s.' % path)
             config['metric'] = config['metric'].strip()
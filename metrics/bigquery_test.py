@@ -43,7 +43,7 @@ class TestBigquery(unittest.TestCase):
 
             with open(path) as config_file:
                 try:
-                    config = yaml.safe_load(config_file)
+                    config = bigquery.SAFE_YAML.load(config_file)
                 except yaml.YAMLError:
                     self.fail(path)
                 self.assertIn('metric', config)
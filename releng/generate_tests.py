@@ -25,13 +25,25 @@ Usage example:
 """
 
 import argparse
+import functools
 import hashlib
+import io
 import os
+import pickle
+import tempfile
 import ruamel.yaml
 
 yaml = ruamel.yaml.YAML(typ='rt')
 yaml.width = float("inf")
 
+# The test config is only read, never dumped back, so it does not need the
+# round-trip loader. The safe loader uses libyaml (via ruamel.yaml.clib) when
+# it is installed and falls back to the pure-Python parser otherwise.
+config_yaml = ruamel.yaml.YAML(typ='safe')
+
+# Bump when the pickled result of load_yaml_config changes shape.
+CONFIG_CACHE_FORMAT = 1
+
 PROW_CONFIG_TEMPLATE = """
     tags:
     - generated # AUTO-GENERATED by releng/generate_tests.py - DO NOT EDIT!
@@ -74,6 +86,7 @@ GCS_LOG_PREFIX = "kubernetes-ci-logs/logs/"
 
 COMMENT = 'AUTO-GENERATED by releng/generate_tests.py - DO NOT EDIT.'
 
+@functools.lru_cache(maxsize=None)
 def get_sha1_hash(data):
     """Returns the SHA1 hash of the specified data."""
     sha1_hash = hashlib.sha1()
@@ -81,39 +94,50 @@ def get_sha1_hash(data):
     return sha1_hash.hexdigest()
 
 
-def substitute(job_name, lines):
-    """Replace '${job_name_hash}' in lines with the SHA1 hash of job_name."""
-    return [line.replace('${job_name_hash}', get_sha1_hash(job_name)[:10]) \
-            for line in lines]
+def get_job_name_hash(job_name):
+    """Returns the value substituted for '${job_name_hash}' in args."""
+    return get_sha1_hash(job_name)[:10]
+
+
+def substitute(job_name_hash, lines):
+    """Replace '${job_name_hash}' in lines with job_name_hash."""
+    return [line.replace('${job_name_hash}', job_name_hash) for line in lines]
 
-def get_args(job_name, field):
+def get_args(job_name_hash, field):
     """Returns a list of args for the given field."""
     if not field:
         return []
-    return substitute(job_name, field.get('args', []))
+    return substitute(job_name_hash, field.get('args', []))
 
 
+def write_yaml_file(output_file, data, header=''):
+    """Renders data as yaml in memory, then writes it to output_file at once."""
+    buf = io.StringIO()
+    buf.write(header)
+    yaml.dump(data, buf)
+    with open(output_file, 'w') as fp:
+        fp.write(buf.getvalue())
+
 def write_prow_configs_file(output_file, job_defs):
     """Writes the Prow configurations into output_file."""
     print(f'writing prow configuration to: {output_file}')
-    with open(output_file, 'w') as fp:
-        yaml.dump(job_defs, fp)
+    write_yaml_file(output_file, job_defs)
 
 def write_testgrid_config_file(output_file, testgrid_config):
     """Writes the TestGrid test group configurations into output_file."""
     print(f'writing testgrid configuration to: {output_file}')
-    with open(output_file, 'w') as fp:
-        fp.write('# ' + COMMENT + '\n\n')
-        yaml.dump(testgrid_config, fp)
+    write_yaml_file(output_file, testgrid_config, '# ' + COMMENT + '\n\n')
 
 def apply_job_overrides(envs_or_args, job_envs_or_args):
     '''Applies the envs or args overrides defined in the job level'''
-    original_envs_or_args = envs_or_args[:]
+    # Index the original entries by name ('--foo' for both '--foo=bar' and
+    # '--foo') once, keeping the first entry for each name.
+    original_by_name = {}
+    for x in envs_or_args:
+        original_by_name.setdefault(x.strip().split('=', 1)[0], x)
     for job_env_or_arg in job_envs_or_args:
         name = job_env_or_arg.split('=', 1)[0]
-        env_or_arg = next(
-            (x for x in original_envs_or_args if (x.strip().startswith('%s=' % name) or
-                                                  x.strip() == name)), None)
+        env_or_arg = original_by_name.get(name)
         if env_or_arg:
             envs_or_args.remove(env_or_arg)
         envs_or_args.append(job_env_or_arg)
@@ -203,10 +227,11 @@ class E2ENodeTest:
             raise ValueError(
                 'envs are disallowed in node e2e test', self.job_name)
         # Generates args.
+        job_name_hash = get_job_name_hash(self.job_name)
         args = []
-        args.extend(get_args(self.job_name, self.common))
-        args.extend(get_args(self.job_name, image))
-        args.extend(get_args(self.job_name, test_suite))
+        args.extend(get_args(job_name_hash, self.common))
+        args.extend(get_args(job_name_hash, image))
+        args.extend(get_args(job_name_hash, test_suite))
         # Generates job config.
         job_config = self.__get_job_def(args)
         # Generates prow config.
@@ -327,12 +352,13 @@ class E2ETest:
             test_suite = self.test_suites[self.job.get("testSuite")]
 
         # Generates args.
+        job_name_hash = get_job_name_hash(self.job_name)
         args = []
-        args.extend(get_args(self.job_name, self.common))
-        args.extend(get_args(self.job_name, cloud_provider))
-        args.extend(get_args(self.job_name, image))
-        args.extend(get_args(self.job_name, k8s_version))
-        args.extend(get_args(self.job_name, test_suite))
+        args.extend(get_args(job_name_hash, self.common))
+        args.extend(get_args(job_name_hash, cloud_provider))
+        args.extend(get_args(job_name_hash, image))
+        args.extend(get_args(job_name_hash, k8s_version))
+        args.extend(get_args(job_name_hash, test_suite))
         # Generates job config.
         job_config = self.__get_job_def(args)
         # Generates Prow config.
@@ -373,7 +399,8 @@ def for_each_job(output_dir, job_name, job, yaml_config):
     job_config, prow_config, testgrid_config = generator.generate()
 
     # Applies job-level overrides.
-    apply_job_overrides(job_config['args'], get_args(job_name, job))
+    apply_job_overrides(job_config['args'],
+                        get_args(get_job_name_hash(job_name), job))
 
     # merge job_config into prow_config
     args = prow_config['spec']['containers'][0]['args']
@@ -384,7 +411,40 @@ def for_each_job(output_dir, job_name, job, yaml_config):
     return prow_config, testgrid_config
 
 
-def main(yaml_config_path, output_dir, testgrid_output_path):
+def load_yaml_config(yaml_config_path, cache_dir=None):
+    """Returns the parsed yaml_config_path, reusing a pickled copy if fresh.
+
+    The pickle lives in cache_dir, the system temp dir by default, and is
+    keyed on the yaml file's mtime and size, so repeated runs against an
+    unchanged config skip the YAML parse. The key also holds the cache
+    format and ruamel.yaml version, so pickles written by an older script
+    or library are reparsed instead of reused.
+    """
+    stat = os.stat(yaml_config_path)
+    key = (CONFIG_CACHE_FORMAT, ruamel.yaml.__version__, stat.st_mtime_ns, stat.st_size)
+    cache_path = os.path.join(
+        cache_dir or tempfile.gettempdir(),
+        'generate_tests-%s.pkl' % hashlib.sha1(
+            os.path.abspath(yaml_config_path).encode('utf-8')).hexdigest())
+    try:
+        with open(cache_path, 'rb') as fp:
+            cached = pickle.load(fp)
+        if isinstance(cached, tuple) and len(cached) == 2 and cached[0] == key:
+            return cached[1]
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+        pass
+
+    with open(yaml_config_path) as fp:
+        yaml_config = config_yaml.load(fp.read())
+    try:
+        with open(cache_path, 'wb') as fp:
+            pickle.dump((key, yaml_config), fp, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError as exc:
+        print(f'not caching parsed config at {cache_path}: {exc}')
+    return yaml_config
+
+
+def main(yaml_config_path, output_dir, testgrid_output_path, yaml_cache_dir=None):
     """Creates test job definitions.
 
     Converts the test configurations in yaml_config_path to the job definitions
@@ -392,13 +452,17 @@ def main(yaml_config_path, output_dir, testgrid_output_path):
     """
     # TODO(yguo0905): Validate the configurations from yaml_config_path.
 
-    with open(yaml_config_path) as fp:
-        yaml_config = yaml.load(fp)
+    yaml_config = load_yaml_config(yaml_config_path, yaml_cache_dir)
 
     output_config = {}
     output_config['periodics'] = []
     testgrid_config = {'test_groups': []}
     job_names = sorted(yaml_config['jobs'].keys())
+    # Jobs are deliberately generated in-process and in order. Generated
+    # configs share objects from yaml_config (e.g. test suite resources),
+    # which the dumper emits as anchors/aliases; building them in worker
+    # processes would break that sharing and make generated.yaml depend on
+    # how jobs were split across workers.
     for job_name in job_names:
         # Get the envs and args for each job defined under "jobs".
         prow, testgrid = for_each_job(
@@ -424,9 +488,13 @@ if __name__ == '__main__':
         '--testgrid-output-path',
         help='Path to testgrid output file',
         default='config/testgrids/generated-test-config.yaml')
+    PARSER.add_argument(
+        '--yaml-cache-dir',
+        help='Dir to cache the parsed yaml config in (default: system temp dir)')
     ARGS = PARSER.parse_args()
 
     main(
         ARGS.yaml_config_path,
         ARGS.output_dir,
-        ARGS.testgrid_output_path)
+        ARGS.testgrid_output_path,
+        ARGS.yaml_cache_dir)
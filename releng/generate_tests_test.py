@@ -14,10 +14,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import pickle
 import unittest
 import tempfile
 import shutil
-from generate_tests import E2ETest
+from generate_tests import E2ETest, load_yaml_config
 
 class TestGenerateTests(unittest.TestCase):
 
@@ -58,6 +60,33 @@ class TestGenerateTests(unittest.TestCase):
         self.assertTrue("sig-release-2.4-blocking" in dashboards)
         self.assertFalse("sig-release-generated" in dashboards)
 
+    def cache_files(self):
+        return [f for f in os.listdir(self.temp_directory) if f.endswith('.pkl')]
+
+    def test_load_yaml_config_reparses_changed_file(self):
+        path = os.path.join(self.temp_directory, 'config.yaml')
+        with open(path, 'w') as fp:
+            fp.write('jobs: {}\n')
+        self.assertEqual(load_yaml_config(path, self.temp_directory), {'jobs': {}})
+        self.assertEqual(len(self.cache_files()), 1)
+        self.assertEqual(load_yaml_config(path, self.temp_directory), {'jobs': {}})
+
+        with open(path, 'w') as fp:
+            fp.write('jobs: {a: 1}\n')
+        self.assertEqual(load_yaml_config(path, self.temp_directory), {'jobs': {'a': 1}})
+
+    def test_load_yaml_config_reparses_bad_cache(self):
+        path = os.path.join(self.temp_directory, 'config.yaml')
+        with open(path, 'w') as fp:
+            fp.write('jobs: {}\n')
+        load_yaml_config(path, self.temp_directory)
+        cache_path = os.path.join(self.temp_directory, self.cache_files()[0])
+        for bad in (b'not a pickle', b'', pickle.dumps(None),
+                    pickle.dumps((('old', 'key'), {'jobs': {'stale': 1}}))):
+            with open(cache_path, 'wb') as fp:
+                fp.write(bad)
+            self.assertEqual(load_yaml_config(path, self.temp_directory), {'jobs': {}})
+
 
 if __name__ == '__main__':
     unittest.main()
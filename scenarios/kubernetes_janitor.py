@@ -20,11 +20,13 @@
 """Dig through jobs/FOO.env, and execute a janitor pass for each of the project"""
 
 import argparse
+import concurrent.futures
 import json
 import os
 import re
 import subprocess
 import sys
+import threading
 
 try:
     from junit_xml import TestSuite, TestCase
@@ -34,6 +36,9 @@ except ImportError:
 
 ORIG_CWD = os.getcwd()  # Checkout changes cwd
 
+PROJECT_RE = re.compile(r'PROJECT=([^\n"]+)')
+GCP_PROJECT_RE = re.compile(r'--gcp-project=(.+)')
+
 def test_infra(*paths):
     """Return path relative to root of test-infra repo."""
     return os.path.join(ORIG_CWD, os.path.dirname(__file__), '..', *paths)
@@ -49,7 +54,7 @@ def parse_project(path):
     """Parse target env file and return GCP project name."""
     with open(path, 'r') as fp:
         env = fp.read()
-    match = re.search(r'PROJECT=([^\n"]+)', env)
+    match = PROJECT_RE.search(env)
     if match:
         project = match.group(1)
         return project
@@ -59,9 +64,10 @@ def parse_project(path):
 def clean_project(project, hours=24, dryrun=False, ratelimit=None, filt=None, python='python3'):
     """Execute janitor for target GCP project """
     # Multiple jobs can share the same project, woooo
-    if project in CHECKED:
-        return
-    CHECKED.add(project)
+    with LOCK:
+        if project in CHECKED:
+            return
+        CHECKED.add(project)
 
     cmd = [python, test_infra('boskos/cmd/janitor/gcp_janitor.py'), '--project=%s' % project]
     cmd.append('--hour=%d' % hours)
@@ -77,7 +83,27 @@ def clean_project(project, hours=24, dryrun=False, ratelimit=None, filt=None, py
     try:
         check(*cmd)
     except subprocess.CalledProcessError:
-        FAILED.append(project)
+        with LOCK:
+            FAILED.append(project)
+
+
+def positive_int(value):
+    """Parse an argparse value as an int of at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError('must be at least 1, got %s' % value)
+    return number
+
+
+def clean_projects(projects, concurrency=1, ratelimit=None, filt=None):
+    """Clean up each (project, hours) pair, running up to concurrency janitors at once."""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [
+            pool.submit(clean_project, project, hours=hours, ratelimit=ratelimit, filt=filt)
+            for project, hours in projects
+        ]
+        for future in futures:
+            future.result()
 
 
 EXEMPT_PROJECTS = [
@@ -86,6 +112,8 @@ EXEMPT_PROJECTS = [
     'k8s-jkns-e2e-gce-f8n-1-7', # federation projects should use fedtidy to clean up
     'k8s-jkns-e2e-gce-f8n-1-8', # federation projects should use fedtidy to clean up
 ]
+# Matches any project name containing an exempt project.
+EXEMPT_RE = re.compile('|'.join(re.escape(p) for p in EXEMPT_PROJECTS))
 
 PR_PROJECTS = {
     # k8s-jkns-pr-bldr-e2e-gce-fdrtn
@@ -100,18 +128,17 @@ PR_PROJECTS = {
     'cri-c8d-pr-node-e2e': 3,
 }
 
-def check_predefine_jobs(jobs, ratelimit):
+def check_predefine_jobs(jobs, ratelimit, concurrency):
     """Handle predefined jobs"""
-    for project, expire in jobs.items():
-        clean_project(project, hours=expire, ratelimit=ratelimit)
+    clean_projects(jobs.items(), concurrency, ratelimit=ratelimit)
 
-def check_ci_jobs():
+def check_ci_jobs(concurrency):
     """Handle CI jobs"""
     with open(test_infra('jobs/config.json')) as fp:
         config = json.load(fp)
 
-    match_re = re.compile(r'--gcp-project=(.+)')
-    for value in list(config.values()):
+    projects = {}  # project: hours, keeping the first job's lifetime for shared projects
+    for value in config.values():
         clean_hours = 24
         found = None
         for arg in value.get('args', []):
@@ -119,28 +146,30 @@ def check_ci_jobs():
             # clean up everything older than 10 days to prevent leak
             if '--soak' in arg:
                 clean_hours = 24 * 10
-            mat = match_re.match(arg)
+            mat = GCP_PROJECT_RE.match(arg)
             if not mat:
                 continue
             project = mat.group(1)
-            if any(b in project for b in EXEMPT_PROJECTS):
+            if EXEMPT_RE.search(project):
                 print('Project %r is exempted in ci-janitor' % project, file=sys.stderr)
                 continue
             found = project
         if found:
-            clean_project(found, clean_hours)
+            projects.setdefault(found, clean_hours)
+    clean_projects(projects.items(), concurrency)
 
 
-def main(mode, ratelimit, projects, age, artifacts, filt):
+def main(mode, ratelimit, projects, age, artifacts, filt, concurrency=1):
     """Run janitor for each project."""
     if mode == 'pr':
-        check_predefine_jobs(PR_PROJECTS, ratelimit)
+        check_predefine_jobs(PR_PROJECTS, ratelimit, concurrency)
     elif mode == 'custom':
         projs = str.split(projects, ',')
-        for proj in projs:
-            clean_project(proj.strip(), hours=age, ratelimit=ratelimit, filt=filt)
+        clean_projects(
+            [(proj.strip(), age) for proj in projs], concurrency,
+            ratelimit=ratelimit, filt=filt)
     else:
-        check_ci_jobs()
+        check_ci_jobs(concurrency)
 
     # Summary
     print('Janitor checked %d project, %d failed to clean up.' % (len(CHECKED), len(FAILED)))
@@ -171,6 +200,7 @@ if __name__ == '__main__':
     # keep some metric
     CHECKED = set()
     FAILED = []
+    LOCK = threading.Lock()  # guards CHECKED and FAILED across janitor threads
     VERBOSE = False
     PARSER = argparse.ArgumentParser()
     PARSER.add_argument(
@@ -197,6 +227,10 @@ if __name__ == '__main__':
         '--filter',
         default=None,
         help='Filter down to these instances(passed into gcp_janitor.py)')
+    PARSER.add_argument(
+        '--concurrency', type=positive_int, default=1,
+        help='Number of projects to clean up at once')
     ARGS = PARSER.parse_args()
     VERBOSE = ARGS.verbose
-    main(ARGS.mode, ARGS.ratelimit, ARGS.projects, ARGS.age, ARGS.artifacts, ARGS.filter)
+    main(ARGS.mode, ARGS.ratelimit, ARGS.projects, ARGS.age, ARGS.artifacts, ARGS.filter,
+         ARGS.concurrency)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+# Copyright 2017 The Kubernetes Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for kubernetes_janitor."""
+
+import argparse
+import subprocess
+import threading
+import unittest
+
+import kubernetes_janitor
+
+
+class Clean(object):
+    """Stub for check that records each janitor run."""
+    def __init__(self, failing):
+        self.failing = failing
+        self.projects = []
+        self.lock = threading.Lock()
+
+    def __call__(self, *cmd):
+        project = [a for a in cmd if a.startswith('--project=')][0][len('--project='):]
+        with self.lock:
+            self.projects.append(project)
+        if project in self.failing:
+            raise subprocess.CalledProcessError(1, cmd)
+
+
+class CleanProjectsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = {
+            name: getattr(kubernetes_janitor, name, None)
+            for name in ('CHECKED', 'FAILED', 'LOCK', 'VERBOSE', 'check')}
+        kubernetes_janitor.CHECKED = set()
+        kubernetes_janitor.FAILED = []
+        kubernetes_janitor.LOCK = threading.Lock()
+        kubernetes_janitor.VERBOSE = False
+
+    def tearDown(self):
+        for name, value in self.saved.items():
+            setattr(kubernetes_janitor, name, value)
+
+    def test_clean_projects_concurrently(self):
+        """Each project is cleaned once and failures are collected."""
+        clean = kubernetes_janitor.check = Clean(failing={'bad-1', 'bad-2'})
+        projects = ['proj-%d' % i for i in range(20)] + ['bad-1', 'bad-2']
+        kubernetes_janitor.clean_projects(
+            [(p, 3) for p in projects + projects], concurrency=8)
+        self.assertEqual(sorted(clean.projects), sorted(projects))
+        self.assertEqual(kubernetes_janitor.CHECKED, set(projects))
+        self.assertEqual(sorted(kubernetes_janitor.FAILED), ['bad-1', 'bad-2'])
+
+    def test_positive_int(self):
+        self.assertEqual(kubernetes_janitor.positive_int('4'), 4)
+        for value in ('0', '-1'):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                kubernetes_janitor.positive_int(value)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -166,11 +166,13 @@ def testgrid_finished_json_contents(finish_time, passed, metadata):
 def upload_string(gcs_path, text, dry):
     """Uploads text to gcs_path if dry is False, otherwise just prints"""
     cmd = ['gsutil', '-q', '-h', 'Content-Type:text/plain', 'cp', '-', gcs_path]
-    print('Run:', cmd, 'stdin=%s' % text, file=sys.stderr)
+    payload = text.encode('utf-8')
     if dry:
+        print('Run:', cmd, 'stdin=%s' % text, file=sys.stderr)
         return
-    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, encoding='utf8')
-    proc.communicate(input=text)
+    print('Run:', cmd, 'stdin=<%d bytes>' % len(payload), file=sys.stderr)
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+    proc.communicate(input=payload)
     if proc.returncode != 0:
         raise RuntimeError(
             "Failed to upload with exit code: %d" % proc.returncode)